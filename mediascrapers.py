@@ -4,16 +4,30 @@
 # Copyright (C) 2018 Elvis Yu-Jing Lin <elvisyjlin@gmail.com>
 # Licensed under the MIT License - https://opensource.org/licenses/MIT
 
+import aiohttp
+import asyncio
+import diskcache
+import functools
+import io
 import json
+import multiprocessing
 import os
+import pickle
 import sys
 import time
 import re
+import requests
 from abc import ABCMeta, abstractmethod
 from bs4 import BeautifulSoup as bs
+from lxml import etree
+from pybloom_live import ScalableBloomFilter
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 from util import seleniumdriver
 from util.file import get_basename, get_extension, rename_file, safe_makedirs
 from util.instagram import parse_node
@@ -21,11 +35,82 @@ from util.twitter import get_twitter_video_url
 from util.url import get_filename, complete_url, download, is_media
 from urllib.parse import urlparse, urlunparse
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    def _json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+ALLOWED_HOSTS = frozenset({'candidteens.net'})
+
+# Page parsing is CPU-bound, so the crawler spreads it over processes rather than threads.
+# Workers are spawned, not forked: the pool starts inside the event loop, whose executor threads are already running.
+_PARSE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+
+_FNAME_BAD = re.compile(r'[<>:"/\\|?*\n\r\t]')
+_POST_RE = re.compile(r'/p/[^/]+/')
+_CAPTCHA_RE = re.compile(r'captcha', re.I)
+
+@functools.lru_cache(maxsize=100_000)
+def normalize_url(url):
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/')
+    return urlunparse(('https', parsed.netloc, path, '', '', ''))
+
+def _cache_key(scraper, name, args, kwargs):
+    return (scraper._name, name, args, tuple(sorted(kwargs.items())))
+
+def cached(ttl):
+    # Memoize a scraper method on disk for ttl seconds, keyed by scraper name, method and arguments
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            key = _cache_key(self, fn.__name__, args, kwargs)
+            result = self._cache.get(key)
+            if result is None:
+                result = fn(self, *args, **kwargs)
+                self._cache.set(key, result, expire=ttl)
+            return result
+        return wrapper
+    return decorator
+
+def _retry_after(headers):
+    # Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date
+    value = headers.get('Retry-After') if headers is not None else None
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _extract_hrefs(source):
+    tree = LexborHTMLParser(source)
+    return [node.attributes['href'] or '' for node in tree.css('a[href]')]
+
+def _extract_links(source, base_url, hosts):
+    # Runs in _PARSE_POOL, so it takes and returns plain strings only
+    links = []
+    for href in _extract_hrefs(source):
+        if href.startswith('#') or 'javascript:' in href.lower():
+            continue
+        # Absolute links that cannot be on an allowed host are dropped before any URL parsing
+        if href.startswith(('http://', 'https://', '//')) and not any(host in href for host in hosts):
+            continue
+        links.append(complete_url(href, base_url))
+    return links
 
 def sanitize_filename(name):
-    import re
-    name = re.sub(r'[<>:"/\\|?*\n\r\t]', '_', name)
-    return name.strip().rstrip('. ')
+    return _FNAME_BAD.sub('_', name).strip().rstrip('. ')
 
 class Scraper(metaclass=ABCMeta):
 
@@ -39,19 +124,17 @@ class Scraper(metaclass=ABCMeta):
         visited.add(url)
 
         try:
-            tasks = self.scrape(url)
+            tasks, links = self._scrape_with_links(url)
         except Exception as e:
             print(f"[!] Failed to scrape {url}: {e}")
             return []
 
-        # Parse links from the current page
-        self._connect(url)
-        soup = bs(self.source(), 'html.parser')
-        links = [
-            complete_url(a['href'], self._driver.current_url)
-            for a in soup.find_all('a', href=True)
-            if a['href'].startswith('/') or a['href'].startswith('http')
-        ]
+        # Parse links from the current page, unless the scraper already did
+        if links is None:
+            self._connect(url)
+            hrefs = _extract_hrefs(self.source())
+            base = self._driver.current_url
+            links = [complete_url(href, base) for href in hrefs if href.startswith(('/', 'http'))]
 
         # Recursively go deeper
         for link in links:
@@ -63,6 +146,8 @@ class Scraper(metaclass=ABCMeta):
         self._scroll_pause_time = scroll_pause
         self._next_page_pause_time = next_page_pause
         self._login_pause_time = 5.0
+        self._host_pause_time = 1.0
+        self._host_next_ok = {}
         self._mode = mode
         self._debug = debug
         self._name = 'scraper'
@@ -83,6 +168,56 @@ class Scraper(metaclass=ABCMeta):
             
         # self._driver.set_window_size(1920, 1080)
 
+        # Chrome exposes network events through CDP, so scrolling can wait for requests instead of a fixed pause
+        self._network_idle_time = 0.5
+        try:
+            self._driver.execute_cdp_cmd('Network.enable', {})
+            self._driver.get_log('performance')
+            self._cdp = True
+        except Exception:
+            self._cdp = False
+
+        # Keep-alive connection pool for direct HTTP requests, sent with the browser's user agent
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=Retry(total=3, backoff_factor=0.3))
+        self._http.mount('http://', adapter)
+        self._http.mount('https://', adapter)
+        self._user_agent = self._driver.execute_script('return navigator.userAgent')
+        self._http.headers['User-Agent'] = self._user_agent
+
+        self._cache = diskcache.Cache('.mediascraper-cache')
+
+    def _conditional_headers(self, url):
+        # Revalidate with the stored ETag / Last-Modified so an unchanged resource comes back as a bodiless 304
+        validators = self._cache.get(('validators', url))
+        headers = {}
+        if validators is not None:
+            etag, last_modified, _ = validators
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            if last_modified is not None:
+                headers['If-Modified-Since'] = last_modified
+        return headers, validators
+
+    def _store_validators(self, url, response_headers, data):
+        etag, last_modified = response_headers.get('ETag'), response_headers.get('Last-Modified')
+        if etag is not None or last_modified is not None:
+            self._cache.set(('validators', url), (etag, last_modified, data), expire=7 * 24 * 60 * 60)
+
+    def _get_json(self, url):
+        headers, validators = self._conditional_headers(url)
+        res = self._http.get(url, cookies=self._selenium_cookies, headers=headers)
+        if res.status_code == 304 and validators is not None:
+            return validators[2]
+        res.raise_for_status()
+        data = _json_loads(res.content)
+        self._store_validators(url, res.headers, data)
+        return data
+
+    @property
+    def _selenium_cookies(self):
+        return {cookie['name']: cookie['value'] for cookie in self._driver.get_cookies()}
+
     def _connect(self, url):
         if self._debug:
             print('Connecting to "{}"...'.format(url))
@@ -91,6 +226,9 @@ class Scraper(metaclass=ABCMeta):
     def source(self):
         return self._driver.page_source
 
+    def _parse(self, source):
+        return bs(source, 'lxml')
+
     def print(self):
         print(self.source())
 
@@ -99,6 +237,10 @@ class Scraper(metaclass=ABCMeta):
             f.write(self.source().encode('utf-8'))
         print('Saved web page to {}.'.format(file))
 
+    def download(self, tasks, path='.', replace=True):
+        for url, folder, name in tqdm(tasks):
+            download(url, path=os.path.join(path, folder), rename=name, replace=replace, session=self._http)
+
     def load_credentials(self, credentials_file):
         assert os.path.exists(credentials_file), 'Error: Credentials file "{}" does not exist.'.format(credentials_file)
 
@@ -115,18 +257,41 @@ class Scraper(metaclass=ABCMeta):
 
     def find_element_by_class_name(self, class_name):
         try:
-            element = self._driver.find_element_by_class_name(class_name)
+            element = self._driver.find_element(By.CLASS_NAME, class_name)
             return element
         except:
             return None
 
+    def _wait_for_network_idle(self, timeout):
+        pending = set()
+        idle_since = time.monotonic()
+        deadline = idle_since + timeout
+        while time.monotonic() < deadline:
+            for entry in self._driver.get_log('performance'):
+                message = _json_loads(entry['message'])['message']
+                if message['method'] == 'Network.requestWillBeSent':
+                    pending.add(message['params']['requestId'])
+                elif message['method'] in ('Network.loadingFinished', 'Network.loadingFailed'):
+                    pending.discard(message['params']['requestId'])
+            now = time.monotonic()
+            if pending:
+                idle_since = now
+            elif now - idle_since >= self._network_idle_time:
+                return
+            time.sleep(0.05)
+
     def scrollToBottom(self, fn=None, times=-1):
         if times < 0: times = sys.maxsize
         last_height, new_height = self._driver.execute_script("return document.body.scrollHeight"), 0
         counter = 0
         while (new_height != last_height or fn is not None and fn()) and counter < times:
+            if self._cdp:
+                self._driver.get_log('performance')  # drop events from before this scroll
             self._driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-            time.sleep(self._scroll_pause_time)
+            if self._cdp:
+                self._wait_for_network_idle(self._scroll_pause_time)
+            else:
+                time.sleep(self._scroll_pause_time)
             last_height = new_height
             new_height = self._driver.execute_script("return document.body.scrollHeight")
             counter += 1
@@ -136,81 +301,171 @@ class Scraper(metaclass=ABCMeta):
     def scrape(self):
         return None
 
-    def scrape_recursive_full_site(self, url, visited=None):
-        from urllib.parse import urlparse, urlunparse
-        from collections import deque
-        import time
-
-        def normalize_url(url):
-            parsed = urlparse(url)
-            path = parsed.path.rstrip('/')
-            return urlunparse(('https', parsed.netloc, path, '', '', ''))
+    def _scrape_with_links(self, url):
+        # Scrapers that can report the links of the page they scraped override this to save a reload
+        return self.scrape(url), None
 
+    def scrape_recursive_full_site(self, url, visited=None, workers=50, visited_file=None):
         if visited is None:
-            visited = set()
+            # The crawl's membership test costs a few bits per URL instead of the full string,
+            # at a 0.1% chance of skipping an unseen page
+            visited = ScalableBloomFilter(initial_capacity=10_000, error_rate=0.001)
+
+        # Pages scraped by earlier runs are still crawled for new links, only their scrape is skipped
+        scraped = None
+        if visited_file is not None:
+            if os.path.exists(visited_file):
+                with open(visited_file, 'rb') as f:
+                    scraped = pickle.load(f)
+            else:
+                scraped = ScalableBloomFilter(initial_capacity=10_000, error_rate=0.001)
+
+        # Discover pages concurrently over plain HTTP, then scrape media page by page with the driver
+        pages = asyncio.run(self._crawl_site(url, visited, workers, scraped))
 
-        sitemap_path = "sitemap.txt"
-        queue = deque([url])
         all_tasks = []
+        for page_url in pages:
+            if _cache_key(self, 'scrape', (page_url,), {}) not in self._cache:
+                time.sleep(self._reserve_host_slot(page_url))  # Throttle per host, only when the driver loads the page
+            try:
+                page_tasks = self.scrape(page_url)
+                all_tasks.extend(page_tasks)
+            except Exception as e:
+                print(f"[!] scrape() failed on {page_url}: {e}")
+                continue
+            if scraped is not None:
+                scraped.add(normalize_url(page_url))
 
-        while queue:
-            current_url = queue.popleft()
+        if visited_file is not None:
+            with open(visited_file, 'wb') as f:
+                pickle.dump(scraped, f)
+
+        return all_tasks
+
+    async def _crawl_site(self, url, visited, workers, scraped=None):
+        sitemap_path = "sitemap.txt"
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        queue.put_nowait(url)
+        driver_lock = asyncio.Lock()
+        pages = []
+
+        async def visit(session, current_url):
             norm_url = normalize_url(current_url)
 
             if norm_url in visited:
-                continue
+                return
 
             visited.add(norm_url)
             print(f"[+] Visiting: {current_url}")
 
             # Log to sitemap
-            with open(sitemap_path, 'a', encoding='utf-8') as f:
-                f.write(norm_url + '\n')
+            sitemap_fp.write(norm_url + '\n')
 
             for attempt in range(3):  # Retry up to 3 times
+                await asyncio.sleep(self._reserve_host_slot(current_url))  # Throttle per host, retries included
                 try:
-                    self._connect(current_url)
-                    soup = bs(self.source(), 'html.parser')
-
-                    # CAPTCHA detection (basic)
-                    if "captcha" in soup.text.lower():
-                        print("[⚠️] CAPTCHA detected. Please solve it in the browser.")
-                        input("Press Enter when you've solved the CAPTCHA...")
-
+                    source = await self._fetch(session, current_url)
+                    if source is None:
+                        # Blocked or CAPTCHA page, fall back to the browser (one page at a time)
+                        async with driver_lock:
+                            source = await loop.run_in_executor(None, self._fetch_with_driver, current_url)
                     break  # Break if successful
                 except Exception as e:
                     print(f"[!] Failed to load {current_url} (attempt {attempt + 1}): {e}")
-                    time.sleep(3)
+                    delay = 3
+                    if isinstance(e, aiohttp.ClientResponseError):
+                        if e.status in (408, 429):
+                            # Timed out or rate limited: back off as long as the server asks, for the whole host
+                            delay = max(delay, _retry_after(e.headers) or 0)
+                            self._delay_host(current_url, delay)
+                        elif 400 <= e.status < 500:
+                            return  # Client errors will not go away on retry, skip this URL
+                    await asyncio.sleep(delay)
             else:
-                continue  # Skip this URL if all retries fail
+                return  # Skip this URL if all retries fail
 
-            # Scrape media
-            try:
-                page_tasks = self.scrape(current_url)
-                all_tasks.extend(page_tasks)
-            except Exception as e:
-                print(f"[!] scrape() failed on {current_url}: {e}")
+            if scraped is None or norm_url not in scraped:
+                pages.append(current_url)
 
             # Discover more links
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if href.startswith('#') or 'javascript:' in href.lower():
-                    continue
-
-                full_url = complete_url(href, current_url)
-                parsed = urlparse(full_url)
+            links = await loop.run_in_executor(_PARSE_POOL, _extract_links, source, current_url, tuple(ALLOWED_HOSTS))
+            for full_url in links:
+                try:
+                    parsed = urlparse(full_url)
+                except ValueError:
+                    continue  # Malformed link, e.g. an unbalanced IPv6 bracket
 
-                if parsed.netloc != 'candidteens.net':
+                if parsed.netloc not in ALLOWED_HOSTS:
                     continue
 
                 norm_link = normalize_url(full_url)
 
                 if norm_link not in visited:
-                    queue.append(full_url)
+                    queue.put_nowait(full_url)
 
-            time.sleep(1)  # Throttle to avoid rate limiting
+        async def worker(session):
+            while True:
+                current_url = await queue.get()
+                try:
+                    await visit(session, current_url)
+                except Exception as e:
+                    # A bad page must not take the worker down, or queue.join() would never return
+                    print(f"[!] Failed to crawl {current_url}: {e}")
+                finally:
+                    queue.task_done()
 
-        return all_tasks
+        sitemap_fp = open(sitemap_path, 'a', encoding='utf-8', buffering=1 << 16)
+        try:
+            connector = aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=30)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                crawlers = [asyncio.ensure_future(worker(session)) for _ in range(workers)]
+                await queue.join()
+                for crawler in crawlers:
+                    crawler.cancel()
+                await asyncio.gather(*crawlers, return_exceptions=True)
+        finally:
+            sitemap_fp.close()
+
+        return pages
+
+    def _reserve_host_slot(self, url):
+        # Space requests to the same host by _host_pause_time and return how long to wait for this one
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        ready = max(now, self._host_next_ok.get(host, 0))
+        self._host_next_ok[host] = ready + self._host_pause_time
+        return ready - now
+
+    def _delay_host(self, url, seconds):
+        host = urlparse(url).netloc
+        self._host_next_ok[host] = max(self._host_next_ok.get(host, 0), time.monotonic() + seconds)
+
+    async def _fetch(self, session, url):
+        async with session.get(url) as response:
+            if response.status == 403:
+                return None
+            response.raise_for_status()
+            if response.content_type != 'text/html':
+                return ''
+            source = await response.text(errors='replace')
+
+        if _CAPTCHA_RE.search(source):
+            return None
+        return source
+
+    def _fetch_with_driver(self, url):
+        self._connect(url)
+        source = self.source()
+        tree = LexborHTMLParser(source)
+
+        # CAPTCHA detection (basic), page text is only extracted when the markup mentions it
+        if _CAPTCHA_RE.search(source) and tree.body is not None and _CAPTCHA_RE.search(tree.body.text()):
+            print("[⚠️] CAPTCHA detected. Please solve it in the browser.")
+            input("Press Enter when you've solved the CAPTCHA...")
+            source = self.source()
+
+        return source
 
     @abstractmethod
     def login(self):
@@ -226,7 +481,8 @@ class MediaScraper(Scraper):
         # self.abs_url_regex = '/^([a-z0-9]*:|.{0})\/\/.*$/gmi'
         # self.rel_url_regex = '/^[^\/]+\/[^\/].*$|^\/[^\/].*$/gmi'
 
-    def scrape(self, url):
+    @cached(ttl=3600)
+    def scrape(self, url, return_links=False):
         self._connect(url)
         self.scrollToBottom()
 
@@ -235,28 +491,42 @@ class MediaScraper(Scraper):
 
         source = self.source()
 
-        # Parse links, images, and videos successively by BeautifulSoup parser.
-
-        media_urls = [] 
-        soup = bs(source, 'html.parser')
-        raw_title = soup.find('title').text
-        title = sanitize_filename(raw_title)
-        for link in soup.find_all('a', href=True):
-            if is_media(link['href']):
-                media_urls.append(link['href'])
-            if is_media(link.text):
-                media_urls.append(link.text)
-        for image in soup.find_all('img', src=True):
-            if is_media(image['src']):
-                media_urls.append(image['src'])
-        for video in soup.find_all('video', src=True):
-            if is_media(video['src']):
-                media_urls.append(video['src'])
+        # Stream links, images, and videos through lxml, dropping each element once it is read.
+
+        raw_title = None
+        hrefs = []
+        media_urls = []
+        is_media_local = is_media
+        buf = io.BytesIO(source.encode('utf-8'))
+        for _, el in etree.iterparse(buf, events=('end',), tag=('a', 'img', 'video', 'title'), html=True, encoding='utf-8'):
+            if el.tag == 'a':
+                href = el.get('href')
+                if href is not None:
+                    hrefs.append(href)
+                    if is_media_local(href):
+                        media_urls.append(href)
+                    text = ''.join(el.itertext())
+                    if text and is_media_local(text):
+                        media_urls.append(text)
+            elif el.tag == 'title':
+                if raw_title is None:
+                    raw_title = el.text or ''
+            else:
+                src = el.get('src')
+                if src is not None and is_media_local(src):
+                    media_urls.append(src)
+            # Keep tails and anything inside an open anchor, its full text is read when the anchor ends
+            el.clear(keep_tail=True)
+            if next(el.iterancestors('a'), None) is None:
+                while el.getprevious() is not None:
+                    del el.getparent()[0]
+        title = sanitize_filename(raw_title or '')
 
         if self._debug:
             print(media_urls)
 
-        tasks = [(complete_url(media_url, self._driver.current_url), title, None) for media_url in media_urls]
+        base = self._driver.current_url
+        tasks = [(complete_url(media_url, base), title, None) for media_url in media_urls]
 
         if self._debug:
             print(tasks)
@@ -264,6 +534,10 @@ class MediaScraper(Scraper):
         if self._mode != 'silent':
             print('{} media are found.'.format(len(media_urls)))
 
+        if return_links:
+            links = [complete_url(href, base) for href in hrefs if href.startswith(('/', 'http'))]
+            return tasks, links
+
         return tasks
 
 
@@ -284,6 +558,9 @@ class MediaScraper(Scraper):
         # for url in urls:
         #     print(url)
 
+    def _scrape_with_links(self, url):
+        return self.scrape(url, return_links=True)
+
     def login(self, credentials_file):
         pass
 
@@ -313,7 +590,7 @@ class InstagramScraper(Scraper):
             'query_hash': '472f257a40c653c64c666ce877d59d2b', 
             'first': 12
         }
-        self.post_regex = '\/p\/[^\/]+\/'
+        self.post_regex = _POST_RE
 
     # def getJsonData(self, target, max_id=None):
     #     if max_id is None:
@@ -324,20 +601,40 @@ class InstagramScraper(Scraper):
     #     data = json.loads(content)
     #     return data
 
+    @cached(ttl=3600)
     def getJsonData(self, user_or_id, after=None):
         if after is None:   # user_or_id should be username
-            self._connect(self.json_data_url.format(user_or_id))
+            url = self.json_data_url.format(user_or_id)
         else:               # user_or_id should be id
-            self._connect(self.new_json_data_url.format(
-                self.query_parameters['query_hash'], user_or_id, self.query_parameters['first'], after))
-        content = self._driver.find_element_by_tag_name('pre').text
-        data = json.loads(content)
+            url = self.new_json_data_url.format(
+                self.query_parameters['query_hash'], user_or_id, self.query_parameters['first'], after)
+        if self._debug:
+            print('Fetching "{}"...'.format(url))
+        data = self._get_json(url)
+        return data
+
+    async def _fetch_post(self, session, semaphore, shortcode):
+        url = self.json_data_url.format('p/' + shortcode)
+        headers, validators = self._conditional_headers(url)
+        async with semaphore:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and validators is not None:
+                    return validators[2]
+                response.raise_for_status()
+                content = await response.read()
+                response_headers = response.headers
+        data = _json_loads(content)
+        self._store_validators(url, response_headers, data)
         return data
 
     def sharedData(self):
         return self._driver.execute_script("return window._sharedData")
 
+    @cached(ttl=3600)
     def scrape(self, username):
+        return asyncio.run(self._scrape_async(username))
+
+    async def _scrape_async(self, username):
         if self._mode != 'silent':
             print('Crawling...')
 
@@ -358,27 +655,38 @@ class InstagramScraper(Scraper):
         end_cursor = page_info['end_cursor']
 
         tasks = []
+        tasks_append = tasks.append
         num_post = 0
-        while len(edges) > 0:
-            num_post += len(edges)
-            for edge in edges:
-                # post = self.getJsonData('p/'+node['code'])
-                post = self.getJsonData('p/'+edge['node']['shortcode'])
-                task = parse_node(post['graphql']['shortcode_media'])
-                tasks += (task[0], username, task[1])
-            # nodes = data['user']['media']['nodes']
-            if has_next_page:
-                # data = self.getJsonData(username, edges[-1]['node']['id'])
-                data = self.getJsonData(user_id, end_cursor)
-                try:
-                    edges = data['data']['user']['edge_owner_to_timeline_media']['edges']
-                except Exception as e:
-                    print(data)
-                    print(e)
-                has_next_page = data['data']['user']['edge_owner_to_timeline_media']['page_info']['has_next_page']
-                end_cursor = data['data']['user']['edge_owner_to_timeline_media']['page_info']['end_cursor']
-            else:
-                break
+        # Post pages are plain JSON, so fetch them concurrently with the browser's session cookies
+        cookies = self._selenium_cookies
+        headers = {'User-Agent': self._user_agent}
+        semaphore = asyncio.Semaphore(8)
+        async with aiohttp.ClientSession(cookies=cookies, headers=headers) as session:
+            while len(edges) > 0:
+                num_post += len(edges)
+                shortcodes = [edge['node']['shortcode'] for edge in edges]
+                posts = await asyncio.gather(
+                    *[self._fetch_post(session, semaphore, shortcode) for shortcode in shortcodes],
+                    return_exceptions=True)
+                for shortcode, post in zip(shortcodes, posts):
+                    if isinstance(post, Exception):
+                        print('Error: failed to fetch post "{}": {}'.format(shortcode, post))
+                        continue
+                    for url, name in parse_node(post['graphql']['shortcode_media']):
+                        tasks_append((url, username, name))
+                # nodes = data['user']['media']['nodes']
+                if has_next_page:
+                    # data = self.getJsonData(username, edges[-1]['node']['id'])
+                    data = self.getJsonData(user_id, end_cursor)
+                    try:
+                        edges = data['data']['user']['edge_owner_to_timeline_media']['edges']
+                    except Exception as e:
+                        print(data)
+                        print(e)
+                    has_next_page = data['data']['user']['edge_owner_to_timeline_media']['page_info']['has_next_page']
+                    end_cursor = data['data']['user']['edge_owner_to_timeline_media']['page_info']['end_cursor']
+                else:
+                    break
 
         if self._mode != 'silent':
             print('{} posts are found.'.format(num_post))
@@ -394,20 +702,19 @@ class InstagramScraper(Scraper):
         if self._mode != 'silent':
             print('Crawling...')
         done = False
-        codes = re.findall(self.post_regex, self.source())
+        codes_set = set(self.post_regex.findall(self.source()))
         while not done:
             done = self.scrollToBottom(fn=lambda: self.find_element_by_class_name('_o5uzb'), times=2)
-            codes += re.findall(self.post_regex, self.source())
-        codes = list(set(codes))
-        codes = [code[3:-1] for code in codes]
+            codes_set.update(self.post_regex.findall(self.source()))
+        codes = [code[3:-1] for code in codes_set]
 
         if self._mode != 'silent':
             print('{} posts are found.'.format(len(codes)))
 
         if self._debug:
             self.save('test.html')
-            with open('shortcodes.txt', 'w') as f:
-                f.write(json.dumps(codes))
+            with open('shortcodes.txt', 'wb') as f:
+                f.write(_json_dumps(codes))
 
         if self._mode != 'silent':
             print('Scraping...')
@@ -450,11 +757,11 @@ class InstagramScraper(Scraper):
         # user['is_private']
         # user['username']
 
-        with open('json.txt', 'w') as f:
-            f.write(json.dumps(sharedData))
+        with open('json.txt', 'wb') as f:
+            f.write(_json_dumps(sharedData))
 
-        with open('ids_shared_data.txt', 'w') as f:
-            f.write(json.dumps(target))
+        with open('ids_shared_data.txt', 'wb') as f:
+            f.write(_json_dumps(target))
 
     def login(self, credentials_file):
         credentials = self.load_credentials(credentials_file)
@@ -469,8 +776,8 @@ class InstagramScraper(Scraper):
         self._connect(self.login_url)
         time.sleep(self._login_pause_time)
 
-        username, password = self._driver.find_elements_by_tag_name('input')
-        button = self._driver.find_element_by_tag_name('button')
+        username, password = self._driver.find_elements(By.TAG_NAME, 'input')
+        button = self._driver.find_element(By.TAG_NAME, 'button')
 
         username.send_keys(credentials['username'])
         password.send_keys(credentials['password'])
@@ -488,6 +795,7 @@ class TwitterScraper(Scraper):
         # self.post_regex = '/p/[ -~]{11}/'
         self.scroll_pause = 3.0
 
+    @cached(ttl=3600)
     def scrape(self, username):
         self._connect('{}/{}/media'.format(self.base_url, username))
 
@@ -497,7 +805,7 @@ class TwitterScraper(Scraper):
         done = self.scrollToBottom()
 
         source = self.source()
-        soup = bs(source, 'html.parser')
+        soup = self._parse(source)
 
         # title = soup.find('title')
         # name = title.get_text().replace('Media Tweets by ', '').replace(' | Twitter', '')
@@ -510,7 +818,7 @@ class TwitterScraper(Scraper):
             photos = li.find_all('div', { "class" : "AdaptiveMedia-photoContainer" })
             if photos == []:
                 try:
-                    img_url, vid_url = get_twitter_video_url(li['data-item-id'])
+                    img_url, vid_url = get_twitter_video_url(li['data-item-id'], session=self._http)
                     tasks.append((img_url+':large', username, get_basename(get_filename(img_url))))
                     tasks.append((vid_url, username, get_basename(get_filename(vid_url))))
                 except Exception as e:
@@ -543,12 +851,13 @@ class TwitterScraper(Scraper):
         self._connect(self.login_url)
         time.sleep(self._login_pause_time)
 
-        usernames = self._driver.find_elements_by_name('session[username_or_email]')
-        passwords = self._driver.find_elements_by_name('session[password]')
-        buttons = self._driver.find_elements_by_tag_name('button')
-        username = [u for u in usernames if u.get_attribute('class') == 'js-username-field email-input js-initial-focus'][0]
-        password = [p for p in passwords if p.get_attribute('class') == 'js-password-field'][0]
-        button = [b for b in buttons if b.text != ''][0]
+        # Locate all three form elements in one script call instead of a round trip per lookup
+        username, password, button = self._driver.execute_script(
+            "return ["
+            "document.querySelector('input[name=\"session[username_or_email]\"].js-username-field.email-input.js-initial-focus'), "
+            "document.querySelector('input[name=\"session[password]\"].js-password-field'), "
+            "[].filter.call(document.getElementsByTagName('button'), function (b) { return b.innerText !== ''; })[0]"
+            "];")
         self._driver.save_screenshot('test.png')
         self._driver.implicitly_wait(10)
 
@@ -568,6 +877,7 @@ class FacebookScraper(Scraper):
         self.login_url = 'https://www.facebook.com/login'
         # self.post_regex = '/p/[ -~]{11}/'
 
+    @cached(ttl=3600)
     def scrape(self, username):
         self._connect('{}/{}/media'.format(self.base_url, username))
 
@@ -577,7 +887,7 @@ class FacebookScraper(Scraper):
         done = self.scrollToBottom()
 
         source = self.source()
-        soup = bs(source, 'html.parser')
+        soup = self._parse(source)
 
         # title = soup.find('title')
         # name = title.get_text().replace('Media Tweets by ', '').replace(' | Twitter', '')
@@ -608,9 +918,9 @@ class FacebookScraper(Scraper):
         self._connect(self.login_url)
         time.sleep(self._login_pause_time)
 
-        email = self._driver.find_element_by_tag_name('email')
-        password = self._driver.find_element_by_tag_name('pass')
-        button = self._driver.find_element_by_tag_name('login')
+        email = self._driver.find_element(By.TAG_NAME, 'email')
+        password = self._driver.find_element(By.TAG_NAME, 'pass')
+        button = self._driver.find_element(By.TAG_NAME, 'login')
 
         email.send_keys(credentials['email'])
         password.send_keys(credentials['password'])
@@ -640,9 +950,9 @@ class pixivScraper(Scraper):
         # TODO
 
         # get page num
-        pager_container = self._driver.get_element_by_class_name('page-list')
-        last_pager = pager_container.get_element_by_tag_name('li')[-1]
-        num_page = int(last_pager.get_element_by_tag_name('a').text)
+        pager_container = self._driver.find_element(By.CLASS_NAME, 'page-list')
+        last_pager = pager_container.find_elements(By.TAG_NAME, 'li')[-1]
+        num_page = int(last_pager.find_element(By.TAG_NAME, 'a').text)
         print('# of page: {}'.format(num_page))
 
         # crawl each page
@@ -658,7 +968,7 @@ class pixivScraper(Scraper):
         done = self.scrollToBottom()
 
         source = self.source()
-        soup = bs(source, 'html.parser')
+        soup = self._parse(source)
 
         # title = soup.find('title')
         # name = title.get_text().replace('Media Tweets by ', '').replace(' | Twitter', '')
@@ -689,10 +999,10 @@ class pixivScraper(Scraper):
         self._connect(self.login_url)
         time.sleep(self._login_pause_time)
 
-        container = self._driver.find_element_by_id('container-login')
+        container = self._driver.find_element(By.ID, 'container-login')
 
-        username, password = container.find_elements_by_tag_name('input')
-        buttons = container.find_element_by_tag_name('button')
+        username, password = container.find_elements(By.TAG_NAME, 'input')
+        buttons = container.find_element(By.TAG_NAME, 'button')
 
         username.send_keys(credentials['username'])
         password.send_keys(credentials['password'])
@@ -46,6 +46,7 @@ def get(driverType, localDriver=True, path='.'):
         chrome_options.add_argument("--disable-web-security")
         # chrome_options.add_argument("--window-size=800,600")
         chrome_options.add_argument("--headless") # will not show the Chrome browser window
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'}) # network events for scrolling
         if localDriver:
             driver = webdriver.Chrome(options=chrome_options)
         else:
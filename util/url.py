@@ -29,7 +29,7 @@ def complete_url(url, current_url):
             url = dir_url + '/' + url
     return url
 
-def download(url, path='.', rename=None, replace=True):
+def download(url, path='.', rename=None, replace=True, session=None):
     if rename is None:
         filename = urllib.parse.unquote(get_filename(url))
     else:
@@ -42,9 +42,9 @@ def download(url, path='.', rename=None, replace=True):
         return
 
     if '.m3u8' in url:
-        twitter_m3u8(url, file.replace('.m3u8', '.ts'))
+        twitter_m3u8(url, file.replace('.m3u8', '.ts'), session=session)
     else:    
-        r = requests.get(url, stream=True)
+        r = (session or requests).get(url, stream=True)
         if r.status_code == 200:
             safe_makedirs(path)
             os.makedirs(os.path.dirname(file), exist_ok=True)
@@ -60,6 +60,7 @@ def download(url, path='.', rename=None, replace=True):
 # Media Types: http://www.iana.org/assignments/media-types/media-types.xhtml
 
 import mimetypes
+import re
 
 def get_mimetype(url):
     return mimetypes.guess_type(url, strict=False)[0]
@@ -72,6 +73,15 @@ def is_video(url):
     mimetype = get_mimetype(url)
     return None if mimetype is None else mimetype.split('/')[0] == 'video'
 
-def is_media(url):
-    mimetype = get_mimetype(url)
-    return False if mimetype is None else mimetype.split('/')[0] == 'image' or mimetype.split('/')[0] == 'video'
\ No newline at end of file
+# Every extension mimetypes maps to an image or video type, matched at the end of
+# the path (before any query string or fragment) by one precompiled pattern.
+
+def _media_extensions():
+    mimetypes.init()
+    types_map = dict(mimetypes.common_types, **mimetypes.types_map)
+    return sorted((ext.lstrip('.') for ext, mimetype in types_map.items()
+                   if mimetype.split('/')[0] in ('image', 'video')), key=len, reverse=True)
+
+_MEDIA_RE = re.compile(r'\.(?:{})(?:\?|#|$)'.format('|'.join(map(re.escape, _media_extensions()))), re.I)
+
+is_media = _MEDIA_RE.search
\ No newline at end of file